@@ -1,16 +1,44 @@
 #!/usr/bin/env python3
 """Redis and Python exercise"""
+import sys
+import threading
 import uuid
 from functools import wraps
-from typing import Callable, Union
+from typing import Callable, List, Union
 
+import msgpack
 import redis
 
+from redis_pool import POOL
+
+REPLAY_CHUNK = 1000
+
+
+def _pack(value) -> bytes:
+    """Serialize a call argument tuple or return value for the history,
+    falling back to repr for types msgpack cannot encode"""
+    return msgpack.packb(value, use_bin_type=True, default=repr)
+
+
+def _count_key(method: Callable) -> str:
+    """Redis key holding the call count of a method"""
+    return method.__qualname__
+
+
+def _history_key(method: Callable) -> str:
+    """Redis stream key holding the call history of a method"""
+    return method.__qualname__ + ":history"
+
+
+def _history_entry(args: tuple, output) -> dict:
+    """Stream fields recording one call with args returning output"""
+    return {'in': _pack(args), 'out': _pack(output)}
+
 
 def count_calls(method: Callable) -> Callable:
     """decorator that takes a single method Callable argument
     and returns a Callable"""
-    key = method.__qualname__
+    key = _count_key(method)
 
     @wraps(method)
     def wrapper(self, *args, **kwargs):
@@ -24,17 +52,23 @@ def count_calls(method: Callable) -> Callable:
 def call_history(method: Callable) -> Callable:
     """stores the history of inputs and outputs for a particular function
     """
+    history_key = _history_key(method)
+
     @wraps(method)
     def wrapper(self, *args, **kwargs):
-        """saves the input and output of each function in redis
+        """saves the input and output of each call as one stream entry,
+        sent with any writes the method queues on this thread's
+        self._local.pipe in a single round-trip
         """
-        input_key = method.__qualname__ + ":inputs"
-        output_key = method.__qualname__ + ":outputs"
-
-        output = method(self, *args, **kwargs)
-
-        self._redis.rpush(input_key, str(args))
-        self._redis.rpush(output_key, str(output))
+        previous = getattr(self._local, 'pipe', None)
+        with self._redis.pipeline(transaction=False) as pipe:
+            self._local.pipe = pipe
+            try:
+                output = method(self, *args, **kwargs)
+                pipe.xadd(history_key, _history_entry(args, output))
+                pipe.execute()
+            finally:
+                self._local.pipe = previous
 
         return output
 
@@ -42,55 +76,108 @@ def call_history(method: Callable) -> Callable:
 
 
 def replay(fn: Callable):
-    """Display the history of calls of a particular function"""
-    r = redis.Redis()
+    """Display the history of calls of a particular function,
+    reading and writing it REPLAY_CHUNK entries at a time"""
+    r = redis.Redis(connection_pool=POOL)
     f_name = fn.__qualname__
-    n_calls = r.get(f_name)
+    n_calls = r.get(_count_key(fn))
     try:
         n_calls = n_calls.decode('utf-8')
     except Exception:
         n_calls = 0
     print(f'{f_name} was called {n_calls} times:')
 
-    ins = r.lrange(f_name + ":inputs", 0, -1)
-    outs = r.lrange(f_name + ":outputs", 0, -1)
-
-    for i, o in zip(ins, outs):
-        try:
-            i = i.decode('utf-8')
-        except Exception:
-            i = ""
-        try:
-            o = o.decode('utf-8')
-        except Exception:
-            o = ""
-
-        print(f'{f_name}(*{i}) -> {o}')
+    history_key = _history_key(fn)
+    line = f_name + '(*{}) -> {}'
+    start = '-'
+
+    while True:
+        entries = r.xrange(history_key, min=start, count=REPLAY_CHUNK)
+        lines = []
+
+        for _, fields in entries:
+            try:
+                i = tuple(msgpack.unpackb(fields[b'in'], raw=False))
+            except Exception:
+                i = ""
+            try:
+                o = msgpack.unpackb(fields[b'out'], raw=False)
+            except Exception:
+                o = ""
+            if isinstance(o, bytes):
+                o = o.hex()
+
+            lines.append(line.format(i, o))
+
+        if lines:
+            sys.stdout.write('\n'.join(lines) + '\n')
+        if len(entries) < REPLAY_CHUNK:
+            break
+        # XRANGE bounds are inclusive: resume just after the last id seen
+        ms, seq = entries[-1][0].split(b'-')
+        start = f'{ms.decode()}-{int(seq) + 1}'
 
 
 class Cache():
     """Cache class with redis"""
 
-    def __init__(self) -> None:
-        self._redis = redis.Redis()
-        self._redis.flushdb()
+    def __init__(self, flush: bool = False) -> None:
+        """Connect to redis through the shared pool
+
+        Args:
+            flush (bool): empty the database first; off by default so
+                existing keys (and web.py's cached pages) survive
+        """
+        self._redis = redis.Redis(connection_pool=POOL)
+        if flush:
+            self._redis.flushdb()
+        self._local = threading.local()
 
     @count_calls
     @call_history
-    def store(self, data: Union[str, bytes, int, float]) -> str:
+    def store(self, data: Union[str, bytes, int, float]) -> bytes:
         """Store method
 
         Args:
             data (Union[str, bytes, int, float]): Data to be stored
 
         Returns:
-            str: string
+            bytes: 16-byte raw uuid the data is stored under
         """
-        key = str(uuid.uuid4())
-        self._redis.set(key, data)
+        key = uuid.uuid4().bytes
+        client = getattr(self._local, 'pipe', None)
+        if client is None:
+            client = self._redis
+        client.set(key, data)
         return key
 
-    def get(self, key: str, fn: Callable = None)\
+    def store_many(self, datas: List[Union[str, bytes, int, float]])\
+            -> List[bytes]:
+        """Store several values in a single round-trip
+
+        The writes are recorded in the call count and history of store,
+        as if store had been called once per value.
+
+        Args:
+            datas (List[Union[str, bytes, int, float]]): Data to be stored
+
+        Returns:
+            List[bytes]: keys, in the same order as datas
+        """
+        keys = [uuid.uuid4().bytes for _ in datas]
+        if not keys:
+            return keys
+        history_key = _history_key(self.store)
+
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.mset(dict(zip(keys, datas)))
+        pipe.incrby(_count_key(self.store), len(keys))
+        for key, data in zip(keys, datas):
+            pipe.xadd(history_key, _history_entry((data,), key))
+        pipe.execute()
+        return keys
+
+    def get(self, key: Union[str, bytes], fn: Callable = None)\
             -> Union[str, bytes, int, float]:
         """ Get data from redis and transform it to its python type """
         data = self._redis.get(key)
@@ -98,16 +185,16 @@ class Cache():
             return fn(data)
         return data
 
-    def get_str(self, key: str) -> str:
+    def get_str(self, key: Union[str, bytes]) -> str:
         """ Transform a redis type variable to a str python type """
         variable = self._redis.get(key)
         return variable.decode("UTF-8")
 
-    def get_int(self, key: str) -> int:
-        """ Transform a redis type variable to a str python type """
+    def get_int(self, key: Union[str, bytes]) -> int:
+        """ Transform a redis type variable to an int python type """
         variable = self._redis.get(key)
         try:
-            variable = int(variable.decode("UTF-8"))
+            variable = int(variable)
         except Exception:
             variable = 0
         return variable
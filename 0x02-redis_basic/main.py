@@ -5,12 +5,13 @@ Main file
 import redis
 
 Cache = __import__('exercise').Cache
+POOL = __import__('redis_pool').POOL
 
-cache = Cache()
+cache = Cache(flush=True)
 
 data = b"hello"
 key = cache.store(data)
-print(key)
+print(key.hex())
 
-local_redis = redis.Redis()
+local_redis = redis.Redis(connection_pool=POOL)
 print(local_redis.get(key))
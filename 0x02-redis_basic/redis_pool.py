@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""Redis connection pool shared by exercise.py and web.py"""
+import os
+import socket
+
+import redis
+
+try:
+    from redis.connection import HiredisParser
+except ImportError:  # redis-py >= 5 moved the parsers
+    from redis._parsers import _HiredisParser as HiredisParser
+
+if os.environ.get('REDIS_SOCKET'):
+    POOL = redis.ConnectionPool(
+        connection_class=redis.UnixDomainSocketConnection,
+        path=os.environ['REDIS_SOCKET'], max_connections=64,
+        parser_class=HiredisParser, socket_timeout=5)
+else:
+    POOL = redis.ConnectionPool(
+        host=os.environ.get('REDIS_HOST', 'localhost'), port=6379,
+        max_connections=64, parser_class=HiredisParser,
+        socket_connect_timeout=1, socket_timeout=5, socket_keepalive=True,
+        socket_keepalive_options={socket.TCP_KEEPIDLE: 60,
+                                  socket.TCP_KEEPINTVL: 10,
+                                  socket.TCP_KEEPCNT: 3})
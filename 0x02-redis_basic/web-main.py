@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+web-main: concurrent cache hits and misses on get_page
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+get_page = __import__('web').get_page
+
+WARM = ["http://example.com", "http://www.python.org"]
+COLD = ["http://www.iana.org", "http://www.w3.org", "http://info.cern.ch"]
+
+if __name__ == "__main__":
+    expected = {url: get_page(url) for url in WARM}
+
+    urls = (WARM + COLD) * 8
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        pages = list(pool.map(get_page, urls))
+
+    for url, page in zip(urls, pages):
+        if url in expected and page != expected[url]:
+            print("mismatch on cached page: {}".format(url))
+    print("{} concurrent calls served".format(len(pages)))
@@ -2,35 +2,98 @@
 """
 web cache and tracker
 """
+import threading
+import time
+import uuid
 import requests
 import redis
+import zstandard
 from functools import wraps
+from requests.adapters import HTTPAdapter
 
-store = redis.Redis()
+from redis_pool import POOL
+
+# zstd (de)compressor objects must not be used by two threads at once
+_zstd = threading.local()
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=64))
+store = redis.Redis(connection_pool=POOL)
+# delete a lock only while it still holds our token, so a fetch that
+# outlives the lock TTL cannot release a lock another caller now owns
+_UNLOCK = store.register_script("""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+""")
+
+
+def _compressor() -> zstandard.ZstdCompressor:
+    """ Returns this thread's zstd compressor """
+    if not hasattr(_zstd, 'compressor'):
+        _zstd.compressor = zstandard.ZstdCompressor(level=3)
+    return _zstd.compressor
+
+
+def _decompressor() -> zstandard.ZstdDecompressor:
+    """ Returns this thread's zstd decompressor """
+    if not hasattr(_zstd, 'decompressor'):
+        _zstd.decompressor = zstandard.ZstdDecompressor()
+    return _zstd.decompressor
+
+
+def _decompress(cached_data):
+    """ Returns the page stored in a cache entry, or None when there is
+    no entry or it is not zstd data (e.g. written before compression) """
+    if not cached_data:
+        return None
+    try:
+        return _decompressor().decompress(cached_data)
+    except zstandard.ZstdError:
+        return None
 
 
 def count_url_access(method):
     """ Decorator counting how many times
-    a URL is accessed """
+    a URL is accessed and caching its zstd-compressed content.
+    On a miss, only the caller holding lock:<url> fetches the page;
+    the others wait briefly for it to be cached """
     @wraps(method)
     def wrapper(url):
         cached_key = "cached:" + url
-        cached_data = store.get(cached_key)
-        if cached_data:
-            return cached_data.decode("utf-8")
-
         count_key = "count:" + url
-        html = method(url)
 
-        store.incr(count_key)
-        store.set(cached_key, html)
-        store.expire(cached_key, 10)
+        pipe = store.pipeline(transaction=False)
+        pipe.incr(count_key)
+        pipe.get(cached_key)
+        _, cached_data = pipe.execute()
+        html = _decompress(cached_data)
+        if html is not None:
+            return html
+
+        lock_key = "lock:" + url
+        token = uuid.uuid4().hex
+        locked = store.set(lock_key, token, nx=True, ex=5)
+        if not locked:
+            for _ in range(5):
+                time.sleep(0.1)
+                html = _decompress(store.get(cached_key))
+                if html is not None:
+                    return html
+
+        try:
+            html = method(url)
+            store.setex(cached_key, 10, _compressor().compress(html))
+        finally:
+            if locked:
+                _UNLOCK(keys=[lock_key], args=[token])
         return html
     return wrapper
 
 
 @count_url_access
-def get_page(url: str) -> str:
-    """ Returns HTML content of a url """
-    res = requests.get(url)
-    return res.text
+def get_page(url: str) -> bytes:
+    """ Returns the raw HTML content of a url """
+    res = _SESSION.get(url, timeout=5)
+    res.raise_for_status()
+    return res.content